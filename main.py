@@ -1,17 +1,55 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Split the cores between uvicorn workers so N processes don't each start a
+# thread per core. Must be set before numpy/torch/faiss load their BLAS/OpenMP.
+_workers = max(1, int(os.getenv("WEB_CONCURRENCY") or "1"))
+NUM_THREADS = max(1, (os.cpu_count() or 1) // _workers)
+os.environ.setdefault("OMP_NUM_THREADS", str(NUM_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(NUM_THREADS))
+
+from contextlib import asynccontextmanager, suppress
+from collections import OrderedDict
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from dotenv import load_dotenv
-import os, json
+import asyncio
+import orjson
 import re
+import hashlib
+import diskcache
 import numpy as np
 import faiss
+import torch
 from sentence_transformers import SentenceTransformer
 import google.generativeai as genai
 
-load_dotenv()
+torch.set_num_threads(NUM_THREADS)
+faiss.omp_set_num_threads(NUM_THREADS)
 
-app = FastAPI(title="AI Fundamental Rights Violation Screener")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _encode_queue
+
+    # Load models once per process so requests never pay the cold-start cost
+    init_ai()
+    _encode_queue = asyncio.Queue()
+    worker = asyncio.create_task(_batch_worker())
+    yield
+    worker.cancel()
+    with suppress(asyncio.CancelledError):
+        await worker
+
+
+app = FastAPI(
+    title="AI Fundamental Rights Violation Screener",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -27,125 +65,308 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 # ---------- GLOBAL HOLDERS (EMPTY INIT) ----------
 embed_model = None
 index = None
-articles = None
+# Article fields as parallel object arrays so matches are a single fancy index
+article_ids = None
+article_summaries = None
+article_texts = None
 gemini = None
+llm_cache = None
+_encode_queue = None  # (scenario, future) pairs waiting for _batch_worker
+
+ARTICLES_PATH = "data/cleaned_constitution_articles.json"
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "models/gemini-2.5-flash")
+CACHE_DIR = "cache"
+# Directory produced by the ONNX export steps in the README; when it is missing
+# we fall back to the PyTorch SentenceTransformer
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx/all-MiniLM-L6-v2")
+ONNX_MODEL_FILE = "model_int8.onnx"
+# Bump whenever build_article_index changes so stale cached indexes are ignored
+INDEX_VERSION = "5"
+LLM_CACHE_TTL = 24 * 60 * 60  # seconds
+
+# Below this many articles an exhaustive scan beats HNSW graph traversal
+HNSW_MIN_ARTICLES = 1000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 40
+HNSW_EF_SEARCH = 16
+
+# Past this many articles, store PQ codes instead of full float32 vectors;
+# 8-bit PQ needs a few thousand points to train its 256 centroids
+PQ_MIN_ARTICLES = 10000
+PQ_M = 16
+PQ_NBITS = 8
+IVF_NPROBE = 8
+
+# Largest top_k any endpoint asks for; sizes the shared search buffers. Searches
+# run synchronously on the event loop, so one pair of buffers is never contended.
+MAX_TOP_K = 5
+_search_distances = np.empty((1, MAX_TOP_K), dtype=np.float32)
+_search_indices = np.empty((1, MAX_TOP_K), dtype=np.int64)
+
+# Query encodes arriving within this window share one model call
+ENCODE_BATCH_SIZE = 32
+ENCODE_BATCH_WINDOW = 0.005  # seconds
+
+SEARCH_CACHE_SIZE = 1024
+_search_cache = OrderedDict()  # (scenario, top_k) -> article positions
 
 
 class ScenarioInput(BaseModel):
     scenario: str
 
 
-# ---------- INITIALIZE AI (ON FIRST REQUEST) ----------
-def init_ai():
-    global embed_model, index, articles, gemini
+class OnnxSentenceEncoder:
+    """int8 ONNX Runtime version of the SentenceTransformer encoder.
 
-    if embed_model is not None:
-        return  # already loaded
+    Mirrors the subset of SentenceTransformer.encode used here (mean pooling
+    over the last hidden state, optional L2 normalization).
+    """
 
-    print("🔄 Loading AI models...")
+    def __init__(self, model_dir: str):
+        # Optional dependencies, only needed once a model has been exported
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = NUM_THREADS
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, **_):
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=256,
+                return_tensors="np",
+            )
+            feed = {k: v.astype(np.int64) for k, v in tokens.items() if k in self.input_names}
+            hidden = self.session.run(None, feed)[0]
 
-    # Load data
-    with open("data/cleaned_constitution_articles.json", encoding="utf-8") as f:
-        articles = json.load(f)
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+        return np.concatenate(batches)
 
-    # Embeddings
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-    texts = [
-        f"{a['article_id']} - {a.get('summary','')} - {a.get('text','')}"
-        for a in articles
-    ]
-    embeddings = embed_model.encode(texts, convert_to_numpy=True)
 
+def load_embed_model():
+    """Return (model, cache key); the key keeps PyTorch and ONNX embeddings apart."""
+    if os.path.exists(os.path.join(ONNX_MODEL_DIR, ONNX_MODEL_FILE)):
+        print("Using ONNX embedding model:", ONNX_MODEL_DIR)
+        return OnnxSentenceEncoder(ONNX_MODEL_DIR), f"{EMBED_MODEL_NAME}-onnx-int8"
+    return SentenceTransformer(EMBED_MODEL_NAME), EMBED_MODEL_NAME
+
+
+# ---------- INITIALIZE AI (AT STARTUP) ----------
+def build_article_index(embeddings):
+    """Build the FAISS index for the article embeddings.
+
+    Embeddings are unit-normalized, so inner product ranks by cosine similarity.
+    """
     dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
+    if len(embeddings) < HNSW_MIN_ARTICLES:
+        # fp16 codes halve the bytes each exhaustive scan reads
+        new_index = faiss.IndexScalarQuantizer(
+            dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+        )
+        new_index.train(embeddings)
+    elif len(embeddings) >= PQ_MIN_ARTICLES:
+        nlist = max(4, int(np.sqrt(len(embeddings))))
+        quantizer = faiss.IndexFlatIP(dimension)
+        new_index = faiss.IndexIVFPQ(
+            quantizer, dimension, nlist, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT
+        )
+        new_index.use_precomputed_table = -1  # keep RAM down; tables don't apply to IP
+        new_index.train(embeddings)
+        new_index.nprobe = IVF_NPROBE
+    else:
+        new_index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        new_index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        new_index.hnsw.efSearch = HNSW_EF_SEARCH
+    new_index.add(embeddings)
+    return new_index
 
-    # Gemini: prefer gemini-2.5-flash first (user confirmed it's working)
-    genai.configure(api_key=GOOGLE_API_KEY)
-    preferred = [
-        "models/gemini-2.5-flash",
-        "models/gemini-1.5-flash",
-        "models/gemini-1.5-pro",
-        "models/gemini-pro",
+
+def encode_articles(model):
+    """Encode every article into a unit-normalized float32 matrix, in corpus order."""
+    texts = [
+        f"{article_id} - {summary} - {text}"
+        for article_id, summary, text in zip(article_ids, article_summaries, article_texts)
     ]
+    # Encode shortest-first so each batch pads to similar lengths, then
+    # scatter the rows back into corpus order
+    order = np.argsort([len(t) for t in texts], kind="stable")
+    sorted_embeddings = model.encode(
+        [texts[i] for i in order],
+        batch_size=1024,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    ).astype(np.float32)
+    embeddings = np.empty_like(sorted_embeddings)
+    embeddings[order] = sorted_embeddings
+    return embeddings
+
+
+def _atomic_write(path: str, write):
+    # Write under a per-process temp name and rename into place, so a crash or a
+    # concurrently starting worker never sees a half-written file. The extension
+    # is kept so np.save doesn't append its own.
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.{os.getpid()}.tmp{ext}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_article_index(model, model_key: str, raw_articles: bytes):
+    """Return the FAISS index for the article corpus, reusing the on-disk cache.
+
+    Embeddings are keyed by corpus + model only, so an INDEX_VERSION bump or an
+    unreadable index rebuilds from the saved matrix instead of re-encoding.
+    """
+    emb_digest = hashlib.sha1(raw_articles + model_key.encode("utf-8")).hexdigest()
+    index_key = f"{model_key}:{INDEX_VERSION}".encode("utf-8")
+    index_digest = hashlib.sha1(raw_articles + index_key).hexdigest()
+    emb_path = os.path.join(CACHE_DIR, f"{emb_digest}.npy")
+    index_path = os.path.join(CACHE_DIR, f"{index_digest}.faiss")
 
-    model_name = None
-    # Try preferred models directly first (fast path)
-    for p in preferred:
+    if os.path.exists(index_path):
         try:
-            _tmp = genai.GenerativeModel(p)
-            model_name = p
-            print("Using preferred model:", p)
-            break
+            cached_index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+            print("Loaded cached article index:", index_digest)
+            return cached_index
         except Exception as e:
-            print("Preferred model not available:", p, e)
+            print("Cached article index unreadable, rebuilding:", e)
 
-    # If none of the preferred worked, fall back to ListModels discovery
-    if model_name is None:
+    embeddings = None
+    if os.path.exists(emb_path):
         try:
-            models_info = genai.list_models()
-            models_list = models_info.get("models") if isinstance(models_info, dict) and "models" in models_info else models_info
-            available = []
-            if isinstance(models_list, list):
-                for m in models_list:
-                    name = m.get("name") if isinstance(m, dict) else getattr(m, "name", None)
-                    supported = None
-                    if isinstance(m, dict):
-                        supported = m.get("supported_generation_methods") or m.get("supportedMethods")
-                    else:
-                        supported = getattr(m, "supported_generation_methods", None) or getattr(m, "supportedMethods", None)
-
-                    supports_generate = False
-                    if supported is not None:
-                        s = supported if isinstance(supported, (list, tuple)) else [supported]
-                        for item in s:
-                            if "generate" in str(item).lower() or "content" in str(item).lower() or "text" in str(item).lower() or "chat" in str(item).lower():
-                                supports_generate = True
-                                break
-
-                    if name and supports_generate:
-                        available.append((name, m))
-
-            if available:
-                print("Available Gemini models:")
-                for n, _ in available:
-                    print(" -", n)
-                for p in preferred:
-                    if p in [n for n, _ in available]:
-                        model_name = p
-                        break
-                if model_name is None:
-                    model_name = available[0][0]
+            embeddings = np.load(emb_path)
+            print("Rebuilding article index from cached embeddings:", emb_digest)
         except Exception as e:
-            print("ListModels failed:", e)
+            print("Cached article embeddings unreadable, re-encoding:", e)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if embeddings is None:
+        embeddings = encode_articles(model)
+        _atomic_write(emb_path, lambda path: np.save(path, embeddings))
+
+    new_index = build_article_index(embeddings)
+    _atomic_write(index_path, lambda path: faiss.write_index(new_index, path))
+    return new_index
 
-    if model_name is None:
-        raise Exception("No suitable generative model available. Run ListModels to see options.")
 
-    gemini = genai.GenerativeModel(model_name)
-    print("Using Gemini model:", model_name)
+def init_ai():
+    global embed_model, index, article_ids, article_summaries, article_texts, gemini, llm_cache
+
+    print("🔄 Loading AI models...")
+
+    llm_cache = diskcache.Cache(os.path.join(CACHE_DIR, "llm"))
+
+    # Load data
+    with open(ARTICLES_PATH, "rb") as f:
+        raw_articles = f.read()
+    articles = orjson.loads(raw_articles)
+    article_ids = np.array([a["article_id"] for a in articles], dtype=object)
+    article_summaries = np.array([a.get("summary", "") for a in articles], dtype=object)
+    article_texts = np.array([a.get("text", "") for a in articles], dtype=object)
+
+    # Embeddings (cached on disk, keyed by corpus + model)
+    embed_model, model_key = load_embed_model()
+    index = load_article_index(embed_model, model_key, raw_articles)
+
+    # GenerativeModel() only records the name; an unknown model surfaces as an
+    # error on the first generate call, which the endpoints report as a 500
+    genai.configure(api_key=GOOGLE_API_KEY)
+    gemini = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    print("Using Gemini model:", GEMINI_MODEL_NAME)
 
     print("✅ AI models loaded successfully")
 
 
-def search_relevant_articles(user_input, top_k=3):
-    query_embedding = embed_model.encode([user_input])
-    _, indices = index.search(query_embedding, top_k)
-    return [articles[i] for i in indices[0]]
+async def _batch_worker():
+    """Coalesce concurrent query encodes into a single embed_model.encode call."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _encode_queue.get()]
+        deadline = loop.time() + ENCODE_BATCH_WINDOW
+        while len(batch) < ENCODE_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_encode_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
 
+        try:
+            embeddings = await asyncio.to_thread(
+                embed_model.encode,
+                [scenario for scenario, _ in batch],
+                batch_size=ENCODE_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        # Skip futures whose request was cancelled while waiting
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+
+async def encode_query(user_input: str):
+    future = asyncio.get_running_loop().create_future()
+    await _encode_queue.put((user_input, future))
+    return await future
+
+
+def _get_search_buffers(top_k: int):
+    """Return reusable (distances, indices) arrays for a 1-query search."""
+    if top_k > MAX_TOP_K:
+        return np.empty((1, top_k), dtype=np.float32), np.empty((1, top_k), dtype=np.int64)
+    # Column slices of a C-contiguous (1, n) array stay contiguous, as FAISS requires
+    return _search_distances[:, :top_k], _search_indices[:, :top_k]
+
+
+async def search_relevant_articles(user_input, top_k=3):
+    """Return (ids, summaries, texts) arrays for the top_k closest articles."""
+    key = (user_input, top_k)
+    positions = _search_cache.get(key)
+    if positions is None:
+        query_embedding = await encode_query(user_input)
+        # A single-vector search is sub-millisecond, so it runs on the event loop
+        distances, indices = _get_search_buffers(top_k)
+        index.search(query_embedding[None, :], top_k, D=distances, I=indices)
+        # Cache article positions, not arrays, so callers can't mutate cached results
+        positions = tuple(int(i) for i in indices[0] if i >= 0)
+        _search_cache[key] = positions
+        if len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    else:
+        _search_cache.move_to_end(key)
+
+    positions = list(positions)
+    return article_ids[positions], article_summaries[positions], article_texts[positions]
 
-def build_prompt(user_scenario, matched_articles):
-    article_text = ""
-    for art in matched_articles:
-        article_text += f"""
-Article: {art['article_id']}
-Summary: {art.get('summary','')}
-Full Text: {art.get('text','')}
----
-"""
 
-    # Provide an explicit plain-text template matching the Colab output
-    return f"""
+# Provide an explicit plain-text template matching the Colab output
+PROMPT_TEMPLATE = """
 You are a legal assistant specialized in Sri Lankan Fundamental Rights.
 
 USER SCENARIO:
@@ -178,6 +399,26 @@ Keep language simple and concise, suitable for ordinary citizens. Do not include
 """
 
 
+def build_prompt(user_scenario, matched_articles):
+    article_text = "".join(
+        f"\nArticle: {article_id}\nSummary: {summary}\nFull Text: {text}\n---\n"
+        for article_id, summary, text in zip(*matched_articles)
+    )
+    return PROMPT_TEMPLATE.format(user_scenario=user_scenario, article_text=article_text)
+
+
+_VIOLATION_NO_RE = re.compile(r"Violation Status:\s*No\b", re.I)
+_VIOLATION_LINE_RE = re.compile(r"Violation Status:.*", re.I)
+_EXPLANATION_RE = re.compile(r"Explanation:\s*.*?(?=\n\nWhat the person can do next:|\Z)", re.S)
+_NEXT_STEPS_RE = re.compile(r"What the person can do next:\s*.*", re.S)
+
+NO_VIOLATION_EXPLANATION = "Explanation:\nNo fundamental rights violation detected."
+NO_VIOLATION_NEXT_STEPS = (
+    "What the person can do next:\n"
+    "No fundamental rights violation detected; no immediate action required."
+)
+
+
 def normalize_analysis_text(text: str) -> str:
     """If the model determines there is no violation, replace the verbose
     'What the person can do next' section with a short, practical note.
@@ -186,92 +427,115 @@ def normalize_analysis_text(text: str) -> str:
         return text
 
     # Detect a clear 'Violation Status: No' (case-insensitive)
-    if re.search(r"Violation Status:\\s*No\\b", text, re.I):
+    if _VIOLATION_NO_RE.search(text):
         # Normalize the Violation Status line
-        text = re.sub(r"(?i)Violation Status:.*", "Violation Status: No", text, count=1)
+        text = _VIOLATION_LINE_RE.sub("Violation Status: No", text, count=1)
 
         # Set a concise Explanation
-        if re.search(r"(?s)Explanation:\\s*.*?(?=\\n\\nWhat the person can do next:|\\Z)", text):
-            text = re.sub(
-                r"(?s)Explanation:\\s*.*?(?=\\n\\nWhat the person can do next:|\\Z)",
-                "Explanation:\nNo fundamental rights violation detected.",
-                text,
-            )
-        else:
-            text = text.strip() + "\\n\\nExplanation:\nNo fundamental rights violation detected."
+        text, found = _EXPLANATION_RE.subn(NO_VIOLATION_EXPLANATION, text)
+        if not found:
+            text = text.strip() + "\n\n" + NO_VIOLATION_EXPLANATION
 
         # Replace or add short action note
-        if re.search(r"(?s)What the person can do next:\\s*.*", text):
-            text = re.sub(
-                r"(?s)What the person can do next:\\s*.*",
-                "What the person can do next:\\nNo fundamental rights violation detected; no immediate action required.",
-                text,
-            )
-        else:
-            text = text.strip() + "\\n\\nWhat the person can do next:\\nNo fundamental rights violation detected; no immediate action required."
+        text, found = _NEXT_STEPS_RE.subn(NO_VIOLATION_NEXT_STEPS, text)
+        if not found:
+            text = text.strip() + "\n\n" + NO_VIOLATION_NEXT_STEPS
 
     return text
 
 
-@app.post("/analyze")
-def analyze(data: ScenarioInput):
-    init_ai()  # 👈 CRITICAL FIX
-    matched_articles = search_relevant_articles(data.scenario)
-    prompt = build_prompt(data.scenario, matched_articles)
-    try:
-        response = gemini.generate_content(prompt)
-        analysis_text = getattr(response, "text", str(response))
-    except Exception as e:
-        print("Generative API error:", e)
-        raise HTTPException(status_code=500, detail=str(e))
+# One pass over the model output; sections may appear in any order or be missing
+_SECTION_HEADER_RE = re.compile(
+    r"(Violation Status|Violated Article\(s\)|Explanation|What the person can do next):"
+)
+_SECTION_NAMES = {
+    "Violation Status": "status",
+    "Violated Article(s)": "article",
+    "Explanation": "explanation",
+    "What the person can do next": "guidance",
+}
+
+
+def parse_analysis_sections(text: str) -> dict:
+    """Split the plain-text model output into its status/article/explanation/guidance sections."""
+    sections = {"status": "", "article": "", "explanation": "", "guidance": ""}
+    seen = set()
+    headers = list(_SECTION_HEADER_RE.finditer(text))
+    for current, following in zip(headers, headers[1:] + [None]):
+        name = _SECTION_NAMES[current.group(1)]
+        if name in seen:
+            continue  # first occurrence wins
+        seen.add(name)
+        end = following.start() if following else len(text)
+        sections[name] = text[current.end():end]
+
+    # Only the status line itself counts, not anything after it
+    sections["status"] = sections["status"].split("\n", 1)[0]
+    return {name: value.strip() for name, value in sections.items()}
+
+
+def _llm_cache_key(prompt: str) -> str:
+    return hashlib.sha1(f"{gemini.model_name}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+async def generate_analysis(prompt: str) -> str:
+    """Return Gemini's text for the prompt, serving repeated prompts from disk."""
+    key = _llm_cache_key(prompt)
+    # diskcache is blocking SQLite I/O; keep it off the event loop
+    cached = await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        return cached
+
+    response = await gemini.generate_content_async(prompt)
+    analysis_text = getattr(response, "text", str(response))
+    if analysis_text:
+        await asyncio.to_thread(llm_cache.set, key, analysis_text, expire=LLM_CACHE_TTL)
+    return analysis_text
+
+
+async def stream_analysis(prompt: str):
+    """Yield Gemini's text for the prompt chunk by chunk; cached prompts yield once."""
+    key = _llm_cache_key(prompt)
+    cached = await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    response = await gemini.generate_content_async(prompt, stream=True)
+    async for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            continue  # finish/safety chunks carry no parts
+        if text:
+            parts.append(text)
+            yield text
 
-    return {
-        #"matched_articles": matched_articles,
-        "analysis": analysis_text
-    }
+    # Never cache an empty stream; generate_analysis would serve it as a hit
+    analysis_text = "".join(parts)
+    if analysis_text:
+        await asyncio.to_thread(llm_cache.set, key, analysis_text, expire=LLM_CACHE_TTL)
 
-@app.post("/screen-scenario")
-def screen_scenario(data: ScenarioInput):
-    """Screen a scenario for FR violations and return structured results"""
-    init_ai()
-    
-    # Search for relevant articles
-    matched_articles = search_relevant_articles(data.scenario, top_k=5)
-    prompt = build_prompt(data.scenario, matched_articles)
-    
-    try:
-        response = gemini.generate_content(prompt)
-        analysis_text = getattr(response, "text", str(response))
-        analysis_text = normalize_analysis_text(analysis_text)
-    except Exception as e:
-        print("Generative API error:", e)
-        raise HTTPException(status_code=500, detail=str(e))
-    
+
+def sse_event(event: str, data) -> str:
+    # JSON-encode the payload so newlines in model output can't break SSE framing
+    return f"event: {event}\ndata: {orjson.dumps(data).decode('utf-8')}\n\n"
+
+
+def build_screening_result(analysis_text: str) -> dict:
+    """Turn the normalized model output into the /screen-scenario response body."""
     # Parse the response into structured format
     violations = []
-    has_violation = "Violation Status:" in analysis_text and "Yes" in analysis_text.split("Violation Status:")[1].split("\n")[0]
-    
+    sections = parse_analysis_sections(analysis_text)
+    has_violation = "Yes" in sections["status"]
+
     if has_violation:
-        # Extract violated articles
-        articles_section = ""
-        if "Violated Article(s):" in analysis_text:
-            articles_section = analysis_text.split("Violated Article(s):")[1].split("Explanation:")[0].strip()
-        
-        # Extract explanation
-        explanation = ""
-        if "Explanation:" in analysis_text:
-            explanation = analysis_text.split("Explanation:")[1].split("What the person can do next:")[0].strip()
-        
-        # Extract guidance
-        guidance = ""
-        if "What the person can do next:" in analysis_text:
-            guidance = analysis_text.split("What the person can do next:")[1].strip()
-        
         violations.append({
             "status": "Violation Detected",
-            "article": articles_section,
-            "explanation": explanation,
-            "guidance": guidance,
+            "article": sections["article"],
+            "explanation": sections["explanation"],
+            "guidance": sections["guidance"],
             "confidence": 0.95
         })
     else:
@@ -293,4 +557,75 @@ def screen_scenario(data: ScenarioInput):
             ]
         },
         "raw_analysis": analysis_text
-    }
\ No newline at end of file
+    }
+
+
+async def _analysis_prompt(scenario: str, top_k: int) -> str:
+    matched_articles = await search_relevant_articles(scenario, top_k)
+    return build_prompt(scenario, matched_articles)
+
+
+async def _run_analysis(scenario: str, top_k: int) -> str:
+    """Search, prompt and generate; shared by the buffered endpoints."""
+    prompt = await _analysis_prompt(scenario, top_k)
+    try:
+        return await generate_analysis(prompt)
+    except Exception as e:
+        print("Generative API error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/analyze")
+async def analyze(data: ScenarioInput):
+    analysis_text = await _run_analysis(data.scenario, top_k=3)
+    return {"analysis": analysis_text}
+
+@app.post("/screen-scenario")
+async def screen_scenario(data: ScenarioInput):
+    """Screen a scenario for FR violations and return structured results"""
+    analysis_text = await _run_analysis(data.scenario, top_k=5)
+    return build_screening_result(normalize_analysis_text(analysis_text))
+
+
+@app.post("/analyze/stream")
+async def analyze_stream(data: ScenarioInput):
+    """Stream the /analyze text as server-sent `chunk` events."""
+    prompt = await _analysis_prompt(data.scenario, top_k=3)
+
+    async def events():
+        try:
+            async for text in stream_analysis(prompt):
+                yield sse_event("chunk", {"text": text})
+        except Exception as e:
+            print("Generative API error:", e)
+            yield sse_event("error", {"detail": str(e)})
+            return
+        yield sse_event("done", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/screen-scenario/stream")
+async def screen_scenario_stream(data: ScenarioInput):
+    """Emit `progress` events while Gemini generates, then one `result` event
+    carrying the same body as /screen-scenario.
+    """
+    prompt = await _analysis_prompt(data.scenario, top_k=5)
+
+    async def events():
+        parts = []
+        received = 0
+        try:
+            async for text in stream_analysis(prompt):
+                parts.append(text)
+                received += len(text)
+                yield sse_event("progress", {"characters": received})
+        except Exception as e:
+            print("Generative API error:", e)
+            yield sse_event("error", {"detail": str(e)})
+            return
+        # Section parsing needs the complete text
+        analysis_text = normalize_analysis_text("".join(parts))
+        yield sse_event("result", build_screening_result(analysis_text))
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -0,0 +1,44 @@
+from main import parse_analysis_sections
+
+
+def test_sections_in_template_order():
+    text = (
+        "Violation Status: Yes\n\n"
+        "Violated Article(s):\nARTICLE 13 – Freedom from arbitrary arrest\n\n"
+        "Explanation:\nThe arrest had no warrant.\n\n"
+        "What the person can do next:\nFile an Article 17 petition."
+    )
+    assert parse_analysis_sections(text) == {
+        "status": "Yes",
+        "article": "ARTICLE 13 – Freedom from arbitrary arrest",
+        "explanation": "The arrest had no warrant.",
+        "guidance": "File an Article 17 petition.",
+    }
+
+
+def test_sections_out_of_order():
+    text = (
+        "Violation Status: Yes\n\n"
+        "Explanation:\nThe arrest had no warrant.\n\n"
+        "Violated Article(s):\nARTICLE 13\n\n"
+        "What the person can do next:\nFile an Article 17 petition."
+    )
+    sections = parse_analysis_sections(text)
+    assert sections["article"] == "ARTICLE 13"
+    assert sections["explanation"] == "The arrest had no warrant."
+    assert sections["guidance"] == "File an Article 17 petition."
+
+
+def test_missing_sections_are_empty():
+    sections = parse_analysis_sections("Violation Status: No\n\nExplanation:\nNothing wrong.")
+    assert sections == {
+        "status": "No",
+        "article": "",
+        "explanation": "Nothing wrong.",
+        "guidance": "",
+    }
+
+
+def test_status_is_read_from_its_own_line_only():
+    assert parse_analysis_sections("Violation Status:\nYes")["status"] == ""
+    assert parse_analysis_sections("no headers here")["status"] == ""